@@ -9,6 +9,7 @@ from datetime import datetime, timezone
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from dotenv import load_dotenv
+from resilience import CircuitOpenError, send_with_resilience
 import logging
 
 # Load .env file for credentials
@@ -152,14 +153,19 @@ class IntersightAuthManager:
         await self.initialize()
         return self._client
 
-    async def make_request(self, method: str, endpoint: str, data: dict = None) -> dict:
+    async def make_request(self, method: str, endpoint: str, data: dict = None, idempotent: bool = None) -> dict:
         """
         Make an authenticated request to Intersight API
         
+        Transient failures are retried with backoff for idempotent requests,
+        and every endpoint goes through its own circuit breaker.
+        
         Args:
             method: HTTP method (GET, POST, PATCH, DELETE)
             endpoint: API endpoint (e.g., '/api/v1/compute/PhysicalSummaries')
             data: Request payload for POST/PATCH requests
+            idempotent: Whether the request can be retried. Defaults to True for
+                GET, PATCH and DELETE and False for POST (creates)
             
         Returns:
             dict: API response
@@ -170,27 +176,33 @@ class IntersightAuthManager:
             raise RuntimeError("IntersightAuthManager not properly initialized")
         
         url = f"{self.base_url}{endpoint}"
-        path = endpoint
+        # Sign the request target exactly as httpx sends it (query percent-encoded)
+        path = httpx.URL(url).raw_path.decode('ascii')
         body = ""
         
         if data:
             body = json.dumps(data)
         
-        headers = self._get_auth_headers(method, path, body)
+        if method.upper() not in ('GET', 'POST', 'PATCH', 'DELETE'):
+            raise ValueError(f"Unsupported HTTP method: {method}")
         
-        try:
+        if idempotent is None:
+            idempotent = method.upper() != 'POST'
+        
+        async def send() -> httpx.Response:
+            # Signed per attempt: the signature covers the Date header
+            headers = self._get_auth_headers(method, path, body)
             if method.upper() == 'GET':
-                response = await self._client.get(url, headers=headers)
+                return await self._client.get(url, headers=headers)
             elif method.upper() == 'POST':
-                response = await self._client.post(url, headers=headers, content=body)
+                return await self._client.post(url, headers=headers, content=body)
             elif method.upper() == 'PATCH':
-                response = await self._client.patch(url, headers=headers, content=body)
-            elif method.upper() == 'DELETE':
-                response = await self._client.delete(url, headers=headers)
+                return await self._client.patch(url, headers=headers, content=body)
             else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
-            
-            response.raise_for_status()
+                return await self._client.delete(url, headers=headers)
+        
+        try:
+            response = await send_with_resilience(url, send, idempotent=idempotent)
             
             if response.content:
                 return response.json()
@@ -208,6 +220,9 @@ class IntersightAuthManager:
         except httpx.RequestError as e:
             logger.error(f"Network Error during Intersight API request: {e}")
             raise RuntimeError(f"Intersight API request failed due to network error: {e}") from e
+        except CircuitOpenError as e:
+            logger.error(f"Intersight API request not sent: {e}")
+            raise
         except Exception as e:
             logger.error(f"An unexpected error occurred during Intersight API request: {e}")
             raise RuntimeError(f"Intersight API request failed: {e}") from e
@@ -3,9 +3,14 @@ import httpx
 import asyncio
 import os
 import json
+import time
 import logging
+from   datetime import datetime, timezone
+from   urllib.parse import quote
 from   auth_manager import apic_auth_manager
 from   intersight_auth_manager import intersight_auth_manager 
+from   resilience import CircuitOpenError, send_with_resilience
+from   snapshot_store import snapshot_store
 
 # set up logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
@@ -15,42 +20,156 @@ logger = logging.getLogger("APICmcp")
 mcp = FastMCP("APICmcp")
 #mcp = FastMCP("APICmcp")
 
+def _snapshot_info(snapshot: dict) -> dict:
+    """
+    Freshness metadata returned by the read tools next to the data.
+    """
+    return {
+        "fetchedAt": datetime.fromtimestamp(snapshot["fetched_at"], timezone.utc).isoformat(),
+        "ageSeconds": int(time.time() - snapshot["fetched_at"]),
+        "fromSnapshot": snapshot["from_snapshot"],
+        "stale": snapshot["stale"],
+    }
+
+async def _fetch_apic_class_objects(class_name: str, since: str = None) -> list:
+    """
+    Fetches the attributes of every object of an APIC class.
+    With since, only the objects modified after that modTs are returned.
+    """
+    await apic_auth_manager.initialize()
+    client = await apic_auth_manager.get_authenticated_client()
+    url = f"{apic_auth_manager.apic_base_url}/api/class/{class_name}.json"
+    if since:
+        # modTs carries a "+00:00" offset; an unencoded '+' is read as a space
+        url = f'{url}?query-target-filter=gt({class_name}.modTs,"{quote(since, safe="")}")'
+    response = await send_with_resilience(url, lambda: client.get(url, timeout=10.0))
+    return [attrs.get("attributes", {}) for mo in response.json().get("imdata", []) for attrs in mo.values()]
+
+async def _read_apic_class(class_name: str, max_age_seconds: float = None) -> dict:
+    return await snapshot_store.read(
+        "apic", class_name,
+        lambda since: _fetch_apic_class_objects(class_name, since),
+        key_field="dn", name_field="name", mod_field="modTs",
+        max_age=max_age_seconds
+    )
+
+async def _fetch_intersight_objects(endpoint: str, since: str = None) -> list:
+    """
+    Fetches the Results of an Intersight collection.
+    With since, only the objects with a ModTime after it are returned
+    (only used for endpoints without their own $filter).
+    """
+    if since:
+        separator = "&" if "?" in endpoint else "?"
+        endpoint = f"{endpoint}{separator}$filter=ModTime gt {since}"
+    result = await intersight_auth_manager.make_request(method="GET", endpoint=endpoint)
+    return result.get("Results", [])
+
+async def _read_intersight_collection(endpoint: str, max_age_seconds: float = None) -> dict:
+    return await snapshot_store.read(
+        "intersight", endpoint,
+        lambda since: _fetch_intersight_objects(endpoint, since),
+        key_field="Moid", name_field="Name", mod_field="ModTime",
+        max_age=max_age_seconds,
+        # an object leaving the filter (e.g. an alarm going to Cleared) is not in a
+        # delta query, so filtered collections are always fully reloaded
+        incremental="$filter=" not in endpoint
+    )
+
 @mcp.tool()
-async def fetch_apic_class(class_name: str) -> str:
+async def fetch_apic_class(class_name: str, max_age_seconds: float = None) -> str:
     """
     Fetches a class of Managed Object from Cisco APIC.
+    Answers from the local inventory snapshot when it is recent enough.
     Requires APIC authentication.
 
     Args:
         class_name (str): The class name of the Managed Object (e.g., 'fvTenant', 'topSystem').
+        max_age_seconds (float): Maximum snapshot age to answer from. 0 forces a live query (full reload).
+            Defaults to SNAPSHOT_MAX_AGE_SECONDS.
 
     Returns:
-        str: The JSON response from APIC.
+        str: The JSON response from APIC, plus the snapshot freshness.
     """
-    logger.info(f"Logging in to APIC")
-    await apic_auth_manager.initialize()
-    client = await apic_auth_manager.get_authenticated_client()
-    if not client:
-        logger.error("Error: Unable to authenticate with APIC. Please check your credentials.")
-    logger.info(f"Authenticated successfully with APIC: {apic_auth_manager.apic_base_url}")
-
-    base_url = apic_auth_manager.apic_base_url
-    url = f"{base_url}/api/class/{class_name}.json"
+    logger.info(f"Fetching APIC class: {class_name}")
 
     try:
-        response = await client.get(url, timeout=10.0)
-        response.raise_for_status()
-        return json.dumps(response.json(), indent=2) 
+        snapshot = await _read_apic_class(class_name, max_age_seconds)
+        result = {
+            "totalCount": str(len(snapshot["objects"])),
+            "imdata": [{class_name: {"attributes": attrs}} for attrs in snapshot["objects"]],
+            "snapshot": _snapshot_info(snapshot),
+        }
+        return json.dumps(result, indent=2) 
     except httpx.HTTPStatusError as e:
         return f"Error: APIC returned status {e.response.status_code} for {e.request.url}. Response: {e.response.text}"
     except httpx.RequestError as e:
         return f"Error: An error occurred while requesting {e.request.url}: {e}"
+    except CircuitOpenError as e:
+        return f"Error: APIC endpoint is unavailable. {e}"
     except RuntimeError as e:
         return f"APIC Authentication Error: {e}"
     except Exception as e:
         return f"An unexpected error occurred: {e}"
 
-async def apic_rest_post(url: str, payload: dict) -> dict:
+@mcp.tool()
+async def fetch_apic_classes(class_queries: list[str], max_concurrency: int = 4, max_age_seconds: float = None) -> str:
+    """
+    Fetches several classes of Managed Objects from Cisco APIC concurrently.
+    Use this instead of chaining fetch_apic_class calls (e.g. fvTenant, fvCtx, fvBD, fvAEPg).
+    Plain class names are answered from the local inventory snapshot when it is recent enough.
+    Requires APIC authentication.
+
+    Args:
+        class_queries (list[str]): Class names, optionally with APIC query options
+            (e.g. ['fvTenant', 'fvBD?query-target-filter=eq(fvBD.name,"web")']).
+        max_concurrency (int): Maximum number of requests in flight at the same time.
+        max_age_seconds (float): Maximum snapshot age to answer from. 0 forces live queries (full reload).
+            Defaults to SNAPSHOT_MAX_AGE_SECONDS.
+
+    Returns:
+        str: Compact JSON keyed by class query with the object count and the attributes of each object.
+    """
+    logger.info(f"Fetching APIC classes: {', '.join(class_queries)}")
+    try:
+        # Authenticate once; every request below reuses the same session cookie
+        await apic_auth_manager.initialize()
+        client = await apic_auth_manager.get_authenticated_client()
+    except RuntimeError as e:
+        return f"APIC Authentication Error: {e}"
+
+    base_url = apic_auth_manager.apic_base_url
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def fetch_one(class_query: str) -> dict:
+        class_name, _, query = class_query.partition("?")
+        url = f"{base_url}/api/class/{class_name}.json"
+        if query:
+            url = f"{url}?{query}"
+        async with semaphore:
+            try:
+                if not query:
+                    snapshot = await _read_apic_class(class_name, max_age_seconds)
+                    objects = snapshot["objects"]
+                    return {"totalCount": len(objects), "objects": objects, "snapshot": _snapshot_info(snapshot)}
+                response = await send_with_resilience(url, lambda: client.get(url, timeout=10.0))
+                data = response.json()
+            except httpx.HTTPStatusError as e:
+                return {"error": f"APIC returned status {e.response.status_code}: {e.response.text}"}
+            except httpx.RequestError as e:
+                return {"error": f"An error occurred while requesting {e.request.url}: {e}"}
+            except CircuitOpenError as e:
+                return {"error": f"APIC endpoint is unavailable. {e}"}
+            except Exception as e:
+                return {"error": f"An unexpected error occurred: {e}"}
+        # Keep only the attributes of each object, dropping the class wrapper
+        objects = [attrs.get("attributes", {}) for mo in data.get("imdata", []) for attrs in mo.values()]
+        return {"totalCount": int(data.get("totalCount", len(objects))), "objects": objects}
+
+    results = await asyncio.gather(*(fetch_one(class_query) for class_query in class_queries))
+    return json.dumps(dict(zip(class_queries, results)), separators=(",", ":"))
+
+async def apic_rest_post(url: str, payload: dict, idempotent: bool = False) -> dict:
     """
     Performs a POST request to APIC's REST API to create or update a Managed Object.
     Requires APIC authentication.
@@ -58,6 +177,9 @@ async def apic_rest_post(url: str, payload: dict) -> dict:
     Args:
         url (str): The URL to POST to
         payload (dict): The JSON payload to POST to the REST API.
+        idempotent (bool): Whether the POST can be safely retried on transient errors.
+            Defaults to False (single attempt). Pass True only for upserts, i.e. payloads
+            with status "created,modified" that are safe to repeat.
 
     Returns:
         dict: The JSON response from APIC or None if failed.   
@@ -73,8 +195,11 @@ async def apic_rest_post(url: str, payload: dict) -> dict:
     base_url = apic_auth_manager.apic_base_url
     full_url = f"{base_url}/{url}"
     try:
-        response = await client.post(full_url, json=payload, timeout=10.0)
-        response.raise_for_status()
+        response = await send_with_resilience(
+            full_url,
+            lambda: client.post(full_url, json=payload, timeout=10.0),
+            idempotent=idempotent
+        )
         logger.info(f"Successfully posted to {full_url}")
         return response.json()
     except httpx.RequestError as e:
@@ -83,6 +208,9 @@ async def apic_rest_post(url: str, payload: dict) -> dict:
     except httpx.HTTPStatusError as e:
         logger.error(f"Request to {full_url} failed with status {e.response.status_code}: {e.response.text}")
         return None
+    except CircuitOpenError as e:
+        logger.error(f"Request to {full_url} not sent: {e}")
+        return None
     
 
 @mcp.tool()
@@ -130,7 +258,7 @@ async def make_aci_backup(scp_server_ip: str, scp_username: str, scp_password: s
             ]
         }
     }
-    await apic_rest_post(url="/api/node/mo/uni.json", payload=remote_location_content)
+    await apic_rest_post(url="/api/node/mo/uni.json", payload=remote_location_content, idempotent=True)
 
     # --- Enable Global AES Encryption Settings ---
     logger.info("Enabling Global AES Encryption Settings")
@@ -178,6 +306,7 @@ async def make_aci_backup(scp_server_ip: str, scp_username: str, scp_password: s
             }]
         }
     }
+    # adminSt "triggered" starts a backup run, so this POST must not be retried
     await apic_rest_post(url="/api/node/mo/uni.json", payload=export_policy_content)
 
 @mcp.tool()
@@ -209,8 +338,9 @@ async def create_tenant(tenant_name: str, description: str = "") -> str:
     }
     
     try:
-        result = await apic_rest_post(url="/api/node/mo/uni.json", payload=tenant_payload)
+        result = await apic_rest_post(url="/api/node/mo/uni.json", payload=tenant_payload, idempotent=True)
         if result:
+            snapshot_store.invalidate("apic", "fvTenant")
             logger.info(f"Successfully created tenant: {tenant_name}")
             return f"✅ Tenant '{tenant_name}' created successfully. Description: {description}"
         else:
@@ -250,8 +380,9 @@ async def create_vrf(tenant_name: str, vrf_name: str, description: str = "") ->
     }
     
     try:
-        result = await apic_rest_post(url="/api/node/mo/uni.json", payload=vrf_payload)
+        result = await apic_rest_post(url="/api/node/mo/uni.json", payload=vrf_payload, idempotent=True)
         if result:
+            snapshot_store.invalidate("apic", "fvCtx")
             logger.info(f"Successfully created VRF: {vrf_name} in tenant: {tenant_name}")
             return f"✅ VRF '{vrf_name}' created successfully in tenant '{tenant_name}'. Description: {description}"
         else:
@@ -302,8 +433,9 @@ async def create_bridge_domain(tenant_name: str, vrf_name: str, bd_name: str, de
     }
     
     try:
-        result = await apic_rest_post(url="/api/node/mo/uni.json", payload=bd_payload)
+        result = await apic_rest_post(url="/api/node/mo/uni.json", payload=bd_payload, idempotent=True)
         if result:
+            snapshot_store.invalidate("apic", "fvBD")
             logger.info(f"Successfully created Bridge Domain: {bd_name} in tenant: {tenant_name}")
             return f"✅ Bridge Domain '{bd_name}' created successfully in tenant '{tenant_name}' and associated with VRF '{vrf_name}'. Description: {description}"
         else:
@@ -318,21 +450,27 @@ async def create_bridge_domain(tenant_name: str, vrf_name: str, bd_name: str, de
 # ============================================================================
 
 @mcp.tool()
-async def get_intersight_servers() -> str:
+async def get_intersight_servers(max_age_seconds: float = None) -> str:
     """
     Retrieves a list of physical servers from Cisco Intersight.
+    Answers from the local inventory snapshot when it is recent enough.
     Requires Intersight authentication.
 
+    Args:
+        max_age_seconds (float): Maximum snapshot age to answer from. 0 forces a live query (full reload).
+            Defaults to SNAPSHOT_MAX_AGE_SECONDS.
+
     Returns:
         str: JSON response containing server information from Intersight.
     """
     logger.info("Fetching servers from Cisco Intersight")
     
     try:
-        result = await intersight_auth_manager.make_request(
-            method="GET",
-            endpoint="/api/v1/compute/PhysicalSummaries"
+        snapshot = await _read_intersight_collection(
+            "/api/v1/compute/PhysicalSummaries",
+            max_age_seconds
         )
+        result = {"ObjectType": "mo.List", "Results": snapshot["objects"], "snapshot": _snapshot_info(snapshot)}
         
         if result:
             logger.info("Successfully retrieved servers from Intersight")
@@ -346,21 +484,27 @@ async def get_intersight_servers() -> str:
         return f"❌ Error fetching servers from Intersight: {str(e)}"
 
 @mcp.tool()
-async def get_intersight_organizations() -> str:
+async def get_intersight_organizations(max_age_seconds: float = None) -> str:
     """
     Retrieves a list of organizations from Cisco Intersight.
+    Answers from the local inventory snapshot when it is recent enough.
     Requires Intersight authentication.
 
+    Args:
+        max_age_seconds (float): Maximum snapshot age to answer from. 0 forces a live query (full reload).
+            Defaults to SNAPSHOT_MAX_AGE_SECONDS.
+
     Returns:
         str: JSON response containing organization information from Intersight.
     """
     logger.info("Fetching organizations from Cisco Intersight")
     
     try:
-        result = await intersight_auth_manager.make_request(
-            method="GET",
-            endpoint="/api/v1/organization/Organizations"
+        snapshot = await _read_intersight_collection(
+            "/api/v1/organization/Organizations",
+            max_age_seconds
         )
+        result = {"ObjectType": "mo.List", "Results": snapshot["objects"], "snapshot": _snapshot_info(snapshot)}
         
         if result:
             logger.info("Successfully retrieved organizations from Intersight")
@@ -374,21 +518,27 @@ async def get_intersight_organizations() -> str:
         return f"❌ Error fetching organizations from Intersight: {str(e)}"
 
 @mcp.tool()
-async def get_intersight_alarms() -> str:
+async def get_intersight_alarms(max_age_seconds: float = None) -> str:
     """
     Retrieves active alarms from Cisco Intersight.
+    Answers from the local inventory snapshot when it is recent enough.
     Requires Intersight authentication.
 
+    Args:
+        max_age_seconds (float): Maximum snapshot age to answer from. 0 forces a live query (full reload).
+            Defaults to SNAPSHOT_MAX_AGE_SECONDS.
+
     Returns:
         str: JSON response containing alarm information from Intersight.
     """
     logger.info("Fetching alarms from Cisco Intersight")
     
     try:
-        result = await intersight_auth_manager.make_request(
-            method="GET",
-            endpoint="/api/v1/cond/Alarms?$filter=Severity in ('Critical', 'Major', 'Minor', 'Warning')"
+        snapshot = await _read_intersight_collection(
+            "/api/v1/cond/Alarms?$filter=Severity in ('Critical', 'Major', 'Minor', 'Warning')",
+            max_age_seconds
         )
+        result = {"ObjectType": "mo.List", "Results": snapshot["objects"], "snapshot": _snapshot_info(snapshot)}
         
         if result:
             logger.info("Successfully retrieved alarms from Intersight")
@@ -471,21 +621,27 @@ async def create_intersight_server_profile(profile_name: str, organization_name:
         return f"❌ Error creating server profile '{profile_name}': {str(e)}"
 
 @mcp.tool()
-async def get_intersight_hyperflex_clusters() -> str:
+async def get_intersight_hyperflex_clusters(max_age_seconds: float = None) -> str:
     """
     Retrieves HyperFlex cluster information from Cisco Intersight.
+    Answers from the local inventory snapshot when it is recent enough.
     Requires Intersight authentication.
 
+    Args:
+        max_age_seconds (float): Maximum snapshot age to answer from. 0 forces a live query (full reload).
+            Defaults to SNAPSHOT_MAX_AGE_SECONDS.
+
     Returns:
         str: JSON response containing HyperFlex cluster information from Intersight.
     """
     logger.info("Fetching HyperFlex clusters from Cisco Intersight")
     
     try:
-        result = await intersight_auth_manager.make_request(
-            method="GET",
-            endpoint="/api/v1/hyperflex/Clusters"
+        snapshot = await _read_intersight_collection(
+            "/api/v1/hyperflex/Clusters",
+            max_age_seconds
         )
+        result = {"ObjectType": "mo.List", "Results": snapshot["objects"], "snapshot": _snapshot_info(snapshot)}
         
         if result:
             logger.info("Successfully retrieved HyperFlex clusters from Intersight")
@@ -498,6 +654,83 @@ async def get_intersight_hyperflex_clusters() -> str:
         logger.error(f"Error fetching HyperFlex clusters from Intersight: {e}")
         return f"❌ Error fetching HyperFlex clusters from Intersight: {str(e)}"
 
+# Short names accepted by get_intersight_aggregations for the collections of the read tools
+INTERSIGHT_COLLECTIONS = {
+    "servers": "/api/v1/compute/PhysicalSummaries",
+    "organizations": "/api/v1/organization/Organizations",
+    "alarms": "/api/v1/cond/Alarms",
+    "hyperflex_clusters": "/api/v1/hyperflex/Clusters",
+}
+
+@mcp.tool()
+async def get_intersight_aggregations(aggregations: list[dict], max_concurrency: int = 4) -> str:
+    """
+    Counts Intersight objects grouped by one or more properties, letting Intersight do the counting
+    ($apply=groupby/aggregate, or $count when no grouping is given). Use it for summaries such as
+    server count by model, alarms by severity and affected object type or HyperFlex clusters by version,
+    instead of downloading the full collections. All aggregations run concurrently.
+    Requires Intersight authentication.
+
+    Args:
+        aggregations (list[dict]): One dict per aggregation with the keys:
+            - collection (str): 'servers', 'organizations', 'alarms', 'hyperflex_clusters' or an API path
+              (e.g. '/api/v1/compute/PhysicalSummaries').
+            - group_by (list[str]): Properties to group by (e.g. ['Severity', 'AffectedMoType']). Empty for a plain count.
+            - filter (str): Optional OData filter (e.g. "Severity ne 'Cleared'").
+            - name (str): Optional key for the result. Defaults to '<collection> by <group_by>'
+              plus ' where <filter>' when filtered; repeated names get a ' (2)', ' (3)' suffix.
+        max_concurrency (int): Maximum number of requests in flight at the same time.
+
+    Returns:
+        str: Compact JSON keyed by aggregation name with the total and the count of each group.
+    """
+    logger.info(f"Running {len(aggregations)} aggregations on Cisco Intersight")
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    def group_by_fields(spec: dict) -> list:
+        # Callers often pass a single property as a plain string
+        group_by = spec.get("group_by") or []
+        return [group_by] if isinstance(group_by, str) else list(group_by)
+
+    async def aggregate(spec: dict) -> dict:
+        collection = spec.get("collection") or ""
+        if collection not in INTERSIGHT_COLLECTIONS and not collection.startswith("/api/v1/"):
+            return {"error": f"Unknown collection '{collection}'. Use one of {', '.join(INTERSIGHT_COLLECTIONS)} "
+                             f"or an API path starting with /api/v1/"}
+        group_by = group_by_fields(spec)
+        params = []
+        if spec.get("filter"):
+            # Percent-encode so '&' or '#' inside the filter cannot cut the query short
+            params.append(f"$filter={quote(spec['filter'], safe='')}")
+        if group_by:
+            params.append(f"$apply=groupby(({','.join(group_by)}), aggregate($count as Total))")
+        else:
+            params.append("$count=true")
+        endpoint = f"{INTERSIGHT_COLLECTIONS.get(collection, collection)}?{'&'.join(params)}"
+        async with semaphore:
+            try:
+                result = await intersight_auth_manager.make_request(method="GET", endpoint=endpoint)
+            except Exception as e:
+                logger.error(f"Error running aggregation {endpoint}: {e}")
+                return {"error": str(e)}
+        if not group_by:
+            return {"total": result.get("Count", 0)}
+        groups = sorted(result.get("Results", []), key=lambda group: group.get("Total", 0), reverse=True)
+        return {"total": sum(group.get("Total", 0) for group in groups), "groups": groups}
+
+    names = []
+    for spec in aggregations:
+        name = spec.get("name") or f"{spec.get('collection') or 'missing collection'} by {', '.join(group_by_fields(spec)) or 'count'}"
+        if not spec.get("name") and spec.get("filter"):
+            name = f"{name} where {spec['filter']}"
+        # Keep every result even if two specs end up with the same name
+        unique_name, suffix = name, 2
+        while unique_name in names:
+            unique_name, suffix = f"{name} ({suffix})", suffix + 1
+        names.append(unique_name)
+    results = await asyncio.gather(*(aggregate(spec) for spec in aggregations))
+    return json.dumps(dict(zip(names, results)), separators=(",", ":"))
+
 
 if __name__ == "__main__":
     logger.info("Starting MCP server APICmcp on STDIO...")
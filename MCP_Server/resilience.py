@@ -0,0 +1,187 @@
+import httpx
+import asyncio
+import os
+import time
+import random
+import logging
+from   urllib.parse import urlsplit
+from   dotenv import load_dotenv
+
+# load .env file for the resilience settings
+load_dotenv()
+
+# set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("Resilience")
+
+# Retry settings (attempts include the first call)
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8.0"))
+
+# Circuit breaker settings
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", "30.0"))
+
+# HTTP statuses that signal a transient controller problem
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised without contacting the controller while its circuit is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for a single controller endpoint.
+
+    closed:    calls go through; consecutive failures are counted.
+    open:      calls fail fast with CircuitOpenError until recovery_timeout elapses.
+    half_open: a single probe call is let through; success closes the
+               circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_timeout: float = CIRCUIT_RECOVERY_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.recovery_timeout:
+                return False
+            logger.info(f"Circuit {self.name} half-open, probing endpoint")
+            self.state = "half_open"
+            self._probe_in_flight = False
+        # half_open: only one probe at a time
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            logger.info(f"Circuit {self.name} closed, endpoint recovered")
+        self.state = "closed"
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.error(f"Circuit {self.name} opened after {self._failures} consecutive failures")
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """
+        Frees the half-open probe slot when a call ends without an outcome (e.g. cancelled).
+        """
+        self._probe_in_flight = False
+
+    def retry_after(self) -> float:
+        """
+        Seconds until the next probe is allowed (0 if the circuit is not open).
+        """
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+
+
+_circuit_breakers = {}
+
+def get_circuit_breaker(url: str) -> CircuitBreaker:
+    """
+    Returns the circuit breaker of the controller and endpoint of a URL.
+    The query string is ignored, so every filter on one endpoint shares a breaker.
+    """
+    parts = urlsplit(url)
+    key = f"{parts.netloc}{parts.path}"
+    if key not in _circuit_breakers:
+        _circuit_breakers[key] = CircuitBreaker(key)
+    return _circuit_breakers[key]
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Network errors, timeouts and 408/429/5xx responses are transient.
+    Other HTTP errors (400, 401, 404, ...) mean the endpoint is healthy but
+    rejected the request.
+    Timeouts count as failures for the circuit breaker but are not retried
+    (see send_with_resilience).
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, httpx.RequestError)
+
+
+def _backoff_delay(attempt: int, error: Exception) -> float:
+    # Honor Retry-After when the controller is throttling us
+    if isinstance(error, httpx.HTTPStatusError):
+        retry_after = error.response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), RETRY_MAX_DELAY)
+    # Full jitter: uniform in [0, base * 2^attempt], capped
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+async def send_with_resilience(url: str, send, idempotent: bool = True, max_attempts: int = RETRY_MAX_ATTEMPTS) -> httpx.Response:
+    """
+    Sends a request through the circuit breaker of its endpoint, retrying
+    transient failures with jittered exponential backoff.
+
+    Timeouts are not retried: a hung controller would otherwise block the
+    caller for several full client timeouts before the breaker opens.
+
+    Args:
+        url (str): Full request URL, used to pick the circuit breaker.
+        send: Coroutine function that performs the request and returns the httpx.Response.
+              It is called again on every attempt, so per-request headers
+              (e.g. signatures with a Date) must be built inside it.
+        idempotent (bool): Only idempotent requests are retried; others get a single attempt.
+        max_attempts (int): Maximum number of attempts, including the first one.
+
+    Returns:
+        httpx.Response: The successful response (raise_for_status already applied).
+
+    Raises:
+        CircuitOpenError: The endpoint circuit is open.
+        httpx.HTTPStatusError, httpx.RequestError: The last error once retries are exhausted.
+    """
+    breaker = get_circuit_breaker(url)
+    attempts = max_attempts if idempotent else 1
+    for attempt in range(attempts):
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit open for {breaker.name}; retry in {breaker.retry_after():.0f}s")
+        try:
+            response = await send()
+            response.raise_for_status()
+        except (httpx.HTTPStatusError, httpx.RequestError) as e:
+            if not is_transient_error(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            # an open breaker would reject the retry anyway; surface the real error now
+            if attempt + 1 >= attempts or isinstance(e, httpx.TimeoutException) or breaker.state == "open":
+                raise
+            delay = _backoff_delay(attempt, e)
+            logger.info(f"Transient error on {breaker.name} ({e}); retry {attempt + 1}/{attempts - 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        except BaseException:
+            # cancellation or an unexpected error in the caller: free the half-open probe slot
+            breaker.release_probe()
+            raise
+        else:
+            breaker.record_success()
+            return response
@@ -0,0 +1,244 @@
+import asyncio
+import os
+import time
+import json
+import sqlite3
+import logging
+from   dotenv import load_dotenv
+
+# load .env file for the snapshot settings
+load_dotenv()
+
+# set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("SnapshotStore")
+
+SNAPSHOT_DB_PATH = os.getenv("SNAPSHOT_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "inventory_snapshot.db"))
+# Read tools answer from the snapshot while it is younger than this (0 disables the snapshot reads)
+SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("SNAPSHOT_MAX_AGE_SECONDS", "300"))
+# Snapshots older than this are refreshed in the background while still being served
+SNAPSHOT_REFRESH_AFTER_SECONDS = float(os.getenv("SNAPSHOT_REFRESH_AFTER_SECONDS", "60"))
+# Background refreshes are incremental and cannot see deleted objects, so they do a full reload this often
+SNAPSHOT_FULL_REFRESH_SECONDS = float(os.getenv("SNAPSHOT_FULL_REFRESH_SECONDS", "3600"))
+
+
+class SnapshotStore:
+    """
+    SQLite snapshot of APIC classes and Intersight collections.
+
+    Every object is stored with its key (DN or Moid), name and modification
+    time. Per collection the store keeps when it was last refreshed, when it
+    was last fully reloaded, and the highest modification time seen, which is
+    the starting point of the next incremental refresh.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_DB_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            " source TEXT NOT NULL,"
+            " collection TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " name TEXT,"
+            " mod_time TEXT,"
+            " body TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " PRIMARY KEY (source, collection, key));"
+            "CREATE INDEX IF NOT EXISTS idx_objects_key ON objects(key);"
+            "CREATE INDEX IF NOT EXISTS idx_objects_name ON objects(source, collection, name);"
+            "CREATE TABLE IF NOT EXISTS collections ("
+            " source TEXT NOT NULL,"
+            " collection TEXT NOT NULL,"
+            " refreshed_at REAL NOT NULL,"
+            " full_refreshed_at REAL NOT NULL,"
+            " high_water TEXT,"
+            " PRIMARY KEY (source, collection));"
+        )
+        self._conn.commit()
+        self._refreshing = {}
+        # bumped by invalidate; a refresh fetched under an older generation is discarded
+        self._generations = {}
+        logger.info(f"SnapshotStore initialized. Path: {path}")
+
+    def load(self, source: str, collection: str) -> dict:
+        """
+        Returns the snapshot of a collection: objects, refreshed_at,
+        full_refreshed_at and high_water, or None if it was never fetched.
+        """
+        state = self._conn.execute(
+            "SELECT refreshed_at, full_refreshed_at, high_water FROM collections WHERE source = ? AND collection = ?",
+            (source, collection)
+        ).fetchone()
+        if state is None:
+            return None
+        rows = self._conn.execute(
+            "SELECT body FROM objects WHERE source = ? AND collection = ? ORDER BY key",
+            (source, collection)
+        ).fetchall()
+        return {
+            "objects": [json.loads(row[0]) for row in rows],
+            "refreshed_at": state[0],
+            "full_refreshed_at": state[1],
+            "high_water": state[2],
+        }
+
+    def find(self, key: str = None, name: str = None, source: str = None) -> list:
+        """
+        Looks up objects by DN/Moid or by name across every stored collection.
+        """
+        query = "SELECT body FROM objects WHERE 1 = 1"
+        params = []
+        if key is not None:
+            query += " AND key = ?"
+            params.append(key)
+        if name is not None:
+            query += " AND name = ?"
+            params.append(name)
+        if source is not None:
+            query += " AND source = ?"
+            params.append(source)
+        return [json.loads(row[0]) for row in self._conn.execute(query, params).fetchall()]
+
+    def save(self, source: str, collection: str, objects: list, key_field: str, name_field: str,
+             mod_field: str, full: bool) -> None:
+        """
+        Stores fetched objects. A full save replaces the collection, an
+        incremental one upserts the changed objects only.
+        """
+        now = time.time()
+        rows = [
+            (source, collection, obj.get(key_field), obj.get(name_field), obj.get(mod_field), json.dumps(obj), now)
+            for obj in objects if obj.get(key_field)
+        ]
+        with self._conn:
+            if full:
+                self._conn.execute("DELETE FROM objects WHERE source = ? AND collection = ?", (source, collection))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO objects (source, collection, key, name, mod_time, body, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            # Only real timestamps count: APIC reports modTs "never" for untouched
+            # objects, which would sort above every date. No mark means a full reload.
+            high_water = self._conn.execute(
+                "SELECT MAX(mod_time) FROM objects WHERE source = ? AND collection = ? AND mod_time GLOB '[0-9]*'",
+                (source, collection)
+            ).fetchone()[0]
+            previous = self._conn.execute(
+                "SELECT full_refreshed_at FROM collections WHERE source = ? AND collection = ?",
+                (source, collection)
+            ).fetchone()
+            full_refreshed_at = now if full or previous is None else previous[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO collections (source, collection, refreshed_at, full_refreshed_at, high_water) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (source, collection, now, full_refreshed_at, high_water)
+            )
+        logger.info(f"Snapshot {source}/{collection} {'reloaded' if full else 'updated'} with {len(rows)} objects")
+
+    def invalidate(self, source: str, collection: str) -> None:
+        """
+        Marks a collection as stale (e.g. after a write) so the next read goes
+        to the controller. The objects stay available for offline reads.
+        Refreshes already in flight were fetched before the write, so their
+        results are discarded.
+        """
+        self._generations[(source, collection)] = self._generations.get((source, collection), 0) + 1
+        with self._conn:
+            self._conn.execute(
+                "UPDATE collections SET refreshed_at = 0 WHERE source = ? AND collection = ?",
+                (source, collection)
+            )
+
+    async def refresh(self, source: str, collection: str, fetch, key_field: str, name_field: str,
+                      mod_field: str, incremental: bool = True) -> dict:
+        """
+        Refreshes a collection from the controller and returns the new snapshot.
+
+        Args:
+            fetch: Coroutine function fetch(since) returning the list of objects.
+                since is None for a full reload, otherwise the highest
+                modification time already stored.
+            incremental (bool): False forces full reloads, e.g. for filtered
+                collections where a modified object can stop matching the filter
+                and a delta query would never remove it.
+
+        Returns:
+            dict: The new snapshot, or None if the collection was invalidated
+                while fetching and the result was discarded.
+        """
+        generation = self._generations.get((source, collection), 0)
+        state = self.load(source, collection)
+        full = (not incremental or state is None or not state["high_water"]
+                or time.time() - state["full_refreshed_at"] > SNAPSHOT_FULL_REFRESH_SECONDS)
+        objects = await fetch(None if full else state["high_water"])
+        if self._generations.get((source, collection), 0) != generation:
+            logger.info(f"Snapshot {source}/{collection} invalidated during refresh, discarding result")
+            return None
+        self.save(source, collection, objects, key_field, name_field, mod_field, full=full)
+        return self.load(source, collection)
+
+    def _refresh_in_background(self, source: str, collection: str, fetch, key_field: str, name_field: str,
+                               mod_field: str, incremental: bool) -> None:
+        if (source, collection) in self._refreshing:
+            return
+
+        async def run():
+            try:
+                await self.refresh(source, collection, fetch, key_field, name_field, mod_field, incremental)
+            except Exception as e:
+                logger.error(f"Background refresh of {source}/{collection} failed: {e}")
+            finally:
+                self._refreshing.pop((source, collection), None)
+
+        # keep a reference so the task is not garbage collected while running
+        self._refreshing[(source, collection)] = asyncio.create_task(run())
+
+    async def read(self, source: str, collection: str, fetch, key_field: str, name_field: str,
+                   mod_field: str, max_age: float = None, incremental: bool = True) -> dict:
+        """
+        Returns a collection from the snapshot when it is younger than max_age,
+        otherwise from the controller. A served snapshot older than
+        SNAPSHOT_REFRESH_AFTER_SECONDS triggers a background refresh. If the
+        controller cannot be reached, the last snapshot is returned marked as stale.
+
+        Answers from the controller (max_age 0, after invalidate or past the
+        staleness bound) always come from a full reload, so they never contain
+        deleted objects. Only background refreshes use incremental deltas, and
+        only when incremental is True.
+
+        Returns:
+            dict: objects, fetched_at (epoch seconds) and from_snapshot / stale flags.
+        """
+        if max_age is None:
+            max_age = SNAPSHOT_MAX_AGE_SECONDS
+        state = self.load(source, collection)
+        if state is not None and max_age > 0:
+            age = time.time() - state["refreshed_at"]
+            if age <= max_age:
+                if age > SNAPSHOT_REFRESH_AFTER_SECONDS:
+                    self._refresh_in_background(source, collection, fetch, key_field, name_field, mod_field, incremental)
+                return {"objects": state["objects"], "fetched_at": state["refreshed_at"],
+                        "from_snapshot": True, "stale": False}
+        try:
+            # a write landing mid-fetch discards the result; fetch once more after it
+            for _ in range(2):
+                state = await self.refresh(source, collection, fetch, key_field, name_field, mod_field, incremental=False)
+                if state is not None:
+                    break
+            else:
+                raise RuntimeError(f"{source}/{collection} kept being invalidated during refresh")
+        except Exception as e:
+            fallback = state or self.load(source, collection)
+            if fallback is None:
+                raise
+            logger.error(f"Refresh of {source}/{collection} failed, serving stale snapshot: {e}")
+            return {"objects": fallback["objects"], "fetched_at": fallback["refreshed_at"],
+                    "from_snapshot": True, "stale": True}
+        return {"objects": state["objects"], "fetched_at": state["refreshed_at"],
+                "from_snapshot": False, "stale": False}
+
+
+# Global instance
+snapshot_store = SnapshotStore()
@@ -0,0 +1,297 @@
+import asyncio
+import os
+import time
+import logging
+import argparse
+import json
+from   concurrent.futures import ThreadPoolExecutor
+from   crewai import Agent, Task, Crew
+from   langchain_community.chat_models import ChatOpenAI
+from   llm_cache import DEFAULT_CACHE_PATH, StubChatModel, enable_llm_cache
+from   instrumentation import CrewInstrumentation, merge_reports
+
+# set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("CrewRunner")
+
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL_NAME", "gpt-3.5-turbo")
+# Number of topics processed at the same time. Bounded by the API rate limit more than by cores.
+DEFAULT_MAX_WORKERS = int(os.getenv("CREW_MAX_WORKERS", "4"))
+
+
+def build_llm(model: str = DEFAULT_MODEL, temperature: float = 0):
+    """
+    Builds the chat model used by the planner, writer and editor agents.
+    """
+    return ChatOpenAI(temperature=temperature, model=model, api_key=os.getenv("OPENAI_API_KEY"))
+
+
+def build_crew(llm=None, verbose: bool = False) -> Crew:
+    """
+    Builds the research/write/edit crew from Research_write_article.ipynb.
+
+    Agents keep per-run state (memory, executor), so every topic of a batch
+    must get its own Crew instance instead of sharing one.
+
+    Args:
+        llm: Chat model for the three agents. A new ChatOpenAI is built if not given.
+        verbose (bool): Enables the crewAI execution logs.
+
+    Returns:
+        Crew: A crew ready to be kicked off with inputs={"topic": ...}.
+    """
+    if llm is None:
+        llm = build_llm()
+
+    planner = Agent(
+        role="Content Planner",
+        goal="Plan engaging and factually accurate content on {topic}",
+        backstory="You're working on planning a blog article "
+                  "about the topic: {topic}."
+                  "You collect information that helps the "
+                  "audience learn something "
+                  "and make informed decisions. "
+                  "Your work is the basis for the "
+                  "Content Writer to write an article on this topic.",
+        allow_delegation=False,
+        verbose=verbose,
+        llm=llm
+    )
+
+    writer = Agent(
+        role="Content Writer",
+        goal="Write insightful and factually accurate "
+             "opinion piece about the topic: {topic}",
+        backstory="You're working on a writing "
+                  "a new opinion piece about the topic: {topic}. "
+                  "You base your writing on the work of "
+                  "the Content Planner, who provides an outline "
+                  "and relevant context about the topic. "
+                  "You follow the main objectives and "
+                  "direction of the outline, "
+                  "as provide by the Content Planner. "
+                  "You also provide objective and impartial insights "
+                  "and back them up with information "
+                  "provide by the Content Planner. "
+                  "You acknowledge in your opinion piece "
+                  "when your statements are opinions "
+                  "as opposed to objective statements.",
+        allow_delegation=False,
+        verbose=verbose,
+        llm=llm
+    )
+
+    editor = Agent(
+        role="Editor",
+        goal="Edit a given blog post to align with "
+             "the writing style of the organization. ",
+        backstory="You are an editor who receives a blog post "
+                  "from the Content Writer. "
+                  "Your goal is to review the blog post "
+                  "to ensure that it follows journalistic best practices,"
+                  "provides balanced viewpoints "
+                  "when providing opinions or assertions, "
+                  "and also avoids major controversial topics "
+                  "or opinions when possible.",
+        allow_delegation=False,
+        verbose=verbose,
+        llm=llm
+    )
+
+    plan = Task(
+        description=(
+            "1. Prioritize the latest trends, key players, "
+                "and noteworthy news on {topic}.\n"
+            "2. Identify the target audience, considering "
+                "their interests and pain points.\n"
+            "3. Develop a detailed content outline including "
+                "an introduction, key points, and a call to action.\n"
+            "4. Include SEO keywords and relevant data or sources."
+        ),
+        expected_output="A comprehensive content plan document "
+            "with an outline, audience analysis, "
+            "SEO keywords, and resources.",
+        agent=planner,
+    )
+
+    write = Task(
+        description=(
+            "1. Use the content plan to craft a compelling "
+                "blog post on {topic}.\n"
+            "2. Incorporate SEO keywords naturally.\n"
+            "3. Sections/Subtitles are properly named "
+                "in an engaging manner.\n"
+            "4. Ensure the post is structured with an "
+                "engaging introduction, insightful body, "
+                "and a summarizing conclusion.\n"
+            "5. Proofread for grammatical errors and "
+                "alignment with the brand's voice.\n"
+        ),
+        expected_output="A well-written blog post "
+            "in markdown format, ready for publication, "
+            "each section should have 2 or 3 paragraphs.",
+        agent=writer,
+    )
+
+    edit = Task(
+        description=("Proofread the given blog post for "
+                     "grammatical errors and "
+                     "alignment with the brand's voice."),
+        expected_output="A well-written blog post in markdown format, "
+                        "ready for publication, "
+                        "each section should have 2 or 3 paragraphs.",
+        agent=editor
+    )
+
+    # plan -> write -> edit depend on each other, so they stay sequential inside one crew.
+    return Crew(
+        agents=[planner, writer, editor],
+        tasks=[plan, write, edit],
+        verbose=2 if verbose else 0
+    )
+
+
+def run_topic(topic: str, llm=None, verbose: bool = False, instrument: bool = False) -> dict:
+    """
+    Runs the crew for a single topic.
+
+    Args:
+        topic (str): The topic of the article.
+        llm: Optional chat model shared by the agents.
+        verbose (bool): Enables the crewAI execution logs.
+        instrument (bool): Records per-task and per-agent time, LLM calls and tokens.
+
+    Returns:
+        dict: topic, result (markdown article or None), elapsed seconds, error (if any)
+              and metrics (instrumentation report, or None).
+    """
+    logger.info(f"Starting crew for topic: {topic}")
+    instrumentation = None
+    start = time.perf_counter()
+    try:
+        if instrument:
+            # callbacks live on the LLM, so concurrent crews must not share one
+            crew = build_crew(llm=llm.copy() if llm is not None else None, verbose=verbose)
+            instrumentation = CrewInstrumentation(label=topic)
+            instrumentation.attach(crew)
+            result = instrumentation.kickoff(crew, inputs={"topic": topic})
+        else:
+            crew = build_crew(llm=llm, verbose=verbose)
+            result = crew.kickoff(inputs={"topic": topic})
+        error = None
+    except Exception as e:
+        logger.error(f"Crew failed for topic {topic}: {e}")
+        result = None
+        error = str(e)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Finished crew for topic: {topic} in {elapsed:.2f}s")
+    metrics = instrumentation.log_report() if instrumentation is not None else None
+    return {"topic": topic, "result": result, "elapsed": elapsed, "error": error, "metrics": metrics}
+
+
+def _build_report(runs: list, elapsed: float, workers: int) -> dict:
+    succeeded = [run for run in runs if run["error"] is None]
+    sequential_time = sum(run["elapsed"] for run in runs)
+    metrics = [run["metrics"] for run in runs if run.get("metrics")]
+    return {
+        "runs": runs,
+        "topics": len(runs),
+        "succeeded": len(succeeded),
+        "failed": len(runs) - len(succeeded),
+        "workers": workers,
+        "elapsed": elapsed,
+        # sum of the individual run times, i.e. what a one-by-one loop would have taken
+        "sequential_time": sequential_time,
+        "speedup": sequential_time / elapsed if elapsed else 0.0,
+        "articles_per_minute": len(succeeded) * 60 / elapsed if elapsed else 0.0,
+        "metrics": merge_reports(metrics) if metrics else None,
+    }
+
+
+def run_batch(topics: list, max_workers: int = DEFAULT_MAX_WORKERS, llm=None, verbose: bool = False,
+              instrument: bool = False) -> dict:
+    """
+    Runs the crew over many topics concurrently with a bounded thread pool.
+
+    Args:
+        topics (list): Topics to write an article about.
+        max_workers (int): Maximum number of crews running at the same time.
+        llm: Optional chat model shared by all the crews.
+        verbose (bool): Enables the crewAI execution logs.
+        instrument (bool): Records per-task and per-agent time, LLM calls and tokens.
+
+    Returns:
+        dict: Per-topic runs (in input order) plus throughput figures.
+    """
+    workers = max(1, min(max_workers, len(topics) or 1))
+    logger.info(f"Running batch of {len(topics)} topics with {workers} workers")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        runs = list(executor.map(lambda topic: run_topic(topic, llm=llm, verbose=verbose, instrument=instrument), topics))
+    report = _build_report(runs, time.perf_counter() - start, workers)
+    logger.info(f"Batch finished: {report['succeeded']}/{report['topics']} articles in {report['elapsed']:.2f}s "
+                f"({report['articles_per_minute']:.2f} articles/min, speedup x{report['speedup']:.2f})")
+    return report
+
+
+async def run_batch_async(topics: list, max_concurrency: int = DEFAULT_MAX_WORKERS, llm=None, verbose: bool = False,
+                          instrument: bool = False) -> dict:
+    """
+    Async version of run_batch for callers that already run an event loop
+    (Jupyter, MCP server). crew.kickoff is blocking, so every run is moved to
+    a worker thread and the number of in-flight crews is bounded by a semaphore.
+
+    Args:
+        topics (list): Topics to write an article about.
+        max_concurrency (int): Maximum number of crews running at the same time.
+        llm: Optional chat model shared by all the crews.
+        verbose (bool): Enables the crewAI execution logs.
+        instrument (bool): Records per-task and per-agent time, LLM calls and tokens.
+
+    Returns:
+        dict: Per-topic runs (in input order) plus throughput figures.
+    """
+    workers = max(1, min(max_concurrency, len(topics) or 1))
+    semaphore = asyncio.Semaphore(workers)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    async def _run(topic: str) -> dict:
+        async with semaphore:
+            return await loop.run_in_executor(executor, lambda: run_topic(topic, llm=llm, verbose=verbose, instrument=instrument))
+
+    logger.info(f"Running async batch of {len(topics)} topics with concurrency {workers}")
+    start = time.perf_counter()
+    try:
+        runs = await asyncio.gather(*(_run(topic) for topic in topics))
+    finally:
+        executor.shutdown(wait=False)
+    report = _build_report(list(runs), time.perf_counter() - start, workers)
+    logger.info(f"Async batch finished: {report['succeeded']}/{report['topics']} articles in {report['elapsed']:.2f}s "
+                f"({report['articles_per_minute']:.2f} articles/min)")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the research/write/edit crew over a batch of topics.")
+    parser.add_argument("topics", nargs="+", help="Topics to write an article about")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="Maximum crews running at the same time")
+    parser.add_argument("--verbose", action="store_true", help="Show the crewAI execution logs")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_PATH, default=None,
+                        help="Cache LLM calls in a SQLite file (default: %(const)s)")
+    parser.add_argument("--offline", action="store_true", help="Use the local stub model instead of OpenAI")
+    parser.add_argument("--instrument", action="store_true", help="Report time, LLM calls and tokens per task and agent")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="Seconds the stub model waits per call")
+    args = parser.parse_args()
+
+    cache = enable_llm_cache(args.cache) if args.cache else None
+    llm = StubChatModel(latency=args.stub_latency) if args.offline else None
+
+    report = run_batch(args.topics, max_workers=args.workers, llm=llm, verbose=args.verbose, instrument=args.instrument)
+    summary = {key: value for key, value in report.items() if key != "runs"}
+    if cache is not None:
+        summary["llm_cache"] = cache.stats()
+    print(json.dumps(summary, indent=2))
+    for run in report["runs"]:
+        print(f"\n# {run['topic']}\n")
+        print(run["result"] if run["error"] is None else f"Error: {run['error']}")
@@ -0,0 +1,194 @@
+import threading
+import time
+import json
+import logging
+from   typing import Any, Dict, List, Optional
+from   uuid import UUID
+from   crewai import Crew
+from   langchain_core.callbacks import BaseCallbackHandler
+from   langchain_core.outputs import LLMResult
+
+# set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("CrewInstrumentation")
+
+
+def _empty_stage() -> dict:
+    return {
+        "elapsed": 0.0,
+        "llm_time": 0.0,
+        "llm_calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "iterations": 0,
+    }
+
+
+class CrewInstrumentation(BaseCallbackHandler):
+    """
+    Records wall time, LLM calls, tokens and agent iterations per task and
+    per agent of one Crew run.
+
+    The crew runs its tasks sequentially, so every LLM call and agent step is
+    attributed to the task currently executing; the task callback closes it
+    and moves on to the next one. Use one instance per crew: in a batch each
+    crew must also get its own LLM instance, otherwise the callbacks of
+    concurrent crews would mix.
+    """
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self._lock = threading.Lock()
+        self._tasks: List[dict] = []
+        self._current = 0
+        self._llm_starts: Dict[UUID, float] = {}
+        self._start = None
+        self._task_start = None
+        self._elapsed = 0.0
+        self._usage_metrics = None
+
+    def attach(self, crew: Crew) -> Crew:
+        """
+        Hooks the instrumentation into the task callbacks, the agent step
+        callbacks and the callbacks of every agent LLM of the crew.
+        """
+        self._tasks = []
+        for task in crew.tasks:
+            stage = _empty_stage()
+            stage["task"] = task.description.split("\n")[0][:80]
+            stage["agent"] = task.agent.role if task.agent else None
+            self._tasks.append(stage)
+            task.callback = self._on_task_end
+
+        seen_llms = set()
+        for agent in crew.agents:
+            agent.step_callback = self._on_agent_step
+            # the executor may already have been built with the previous callback
+            if getattr(agent, "agent_executor", None) is not None:
+                agent.agent_executor.step_callback = self._on_agent_step
+            if id(agent.llm) in seen_llms:
+                continue
+            seen_llms.add(id(agent.llm))
+            # crewAI sets its own token counter on llm.callbacks; keep it and add ours
+            agent.llm.callbacks = list(agent.llm.callbacks or []) + [self]
+        return crew
+
+    def kickoff(self, crew: Crew, inputs: Optional[dict] = None) -> Any:
+        """
+        Runs crew.kickoff while recording the total wall time.
+        """
+        self._current = 0
+        self._start = time.perf_counter()
+        self._task_start = self._start
+        try:
+            return crew.kickoff(inputs=inputs)
+        finally:
+            self._elapsed = time.perf_counter() - self._start
+            self._usage_metrics = getattr(crew, "usage_metrics", None)
+
+    def _stage(self) -> Optional[dict]:
+        if self._current < len(self._tasks):
+            return self._tasks[self._current]
+        return None
+
+    # ------------------------------------------------------------------
+    # crewAI callbacks
+    # ------------------------------------------------------------------
+
+    def _on_task_end(self, output: Any) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            stage = self._stage()
+            if stage is not None:
+                stage["elapsed"] = now - (self._task_start or now)
+            self._current += 1
+            self._task_start = now
+
+    def _on_agent_step(self, step: Any) -> None:
+        with self._lock:
+            stage = self._stage()
+            if stage is not None:
+                stage["iterations"] += 1
+
+    # ------------------------------------------------------------------
+    # langchain callbacks
+    # ------------------------------------------------------------------
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *,
+                            run_id: UUID, **kwargs: Any) -> None:
+        self._llm_starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *,
+                     run_id: UUID, **kwargs: Any) -> None:
+        self._llm_starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._llm_starts.pop(run_id, None)
+        # cache hits carry no llm_output, so they count as calls without tokens
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        with self._lock:
+            stage = self._stage()
+            if stage is None:
+                return
+            stage["llm_calls"] += 1
+            if started is not None:
+                stage["llm_time"] += time.perf_counter() - started
+            stage["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            stage["completion_tokens"] += usage.get("completion_tokens", 0)
+            stage["total_tokens"] += usage.get("total_tokens", 0)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_starts.pop(run_id, None)
+
+    # ------------------------------------------------------------------
+    # report
+    # ------------------------------------------------------------------
+
+    def report(self) -> dict:
+        """
+        Returns the structured report of the run: totals, per task, per agent
+        and the most expensive task by wall time.
+        """
+        with self._lock:
+            tasks = [dict(stage) for stage in self._tasks]
+
+        agents: Dict[str, dict] = {}
+        totals = _empty_stage()
+        for stage in tasks:
+            agent = agents.setdefault(stage["agent"] or "unknown", _empty_stage())
+            for key in totals:
+                agent[key] += stage[key]
+                totals[key] += stage[key]
+        totals["elapsed"] = self._elapsed
+
+        slowest = max(tasks, key=lambda stage: stage["elapsed"]) if tasks else None
+        return {
+            "label": self.label,
+            "totals": totals,
+            "tasks": tasks,
+            "agents": agents,
+            "slowest_task": slowest["task"] if slowest else None,
+            "crew_usage_metrics": self._usage_metrics,
+        }
+
+    def log_report(self) -> dict:
+        report = self.report()
+        logger.info(f"Crew report {self.label}: {json.dumps(report, default=str)}")
+        return report
+
+
+def merge_reports(reports: List[dict]) -> dict:
+    """
+    Adds up the per-agent figures of several crew reports, e.g. a whole batch.
+    """
+    agents: Dict[str, dict] = {}
+    totals = _empty_stage()
+    for report in reports:
+        for role, stage in report["agents"].items():
+            agent = agents.setdefault(role, _empty_stage())
+            for key in totals:
+                agent[key] += stage[key]
+        for key in totals:
+            totals[key] += report["totals"][key]
+    return {"runs": len(reports), "totals": totals, "agents": agents}
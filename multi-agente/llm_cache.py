@@ -0,0 +1,162 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import logging
+from   typing import Any, Callable, Dict, List, Optional, Sequence
+from   langchain_core.caches import BaseCache
+from   langchain_core.globals import set_llm_cache
+from   langchain_core.language_models.chat_models import BaseChatModel
+from   langchain_core.load import dumps, loads
+from   langchain_core.messages import AIMessage, BaseMessage
+from   langchain_core.outputs import ChatGeneration, ChatResult, Generation
+
+# set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("CrewLLMCache")
+
+DEFAULT_CACHE_PATH = os.getenv("CREW_LLM_CACHE_PATH", ".crew_llm_cache.db")
+DEFAULT_CACHE_MAX_ENTRIES = int(os.getenv("CREW_LLM_CACHE_MAX_ENTRIES", "5000"))
+
+
+class PersistentLLMCache(BaseCache):
+    """
+    Content-addressed SQLite cache for LLM calls.
+
+    Entries are keyed by sha256(llm_string, prompt). langchain builds the
+    llm_string from the model name and every call parameter (temperature,
+    stop words, ...), so any change to model, prompt or parameters is a miss.
+    Once max_entries is exceeded the least recently used entries are evicted.
+
+    Only deterministic calls (temperature=0, as in the notebook) should be
+    cached; with a higher temperature every re-run returns the first sample.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # crew_runner calls the LLM from several worker threads
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " llm_string TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+        self._conn.commit()
+        logger.info(f"PersistentLLMCache initialized. Path: {path}, max entries: {max_entries}")
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        try:
+            return loads(row[0])
+        except Exception as e:
+            logger.error(f"Discarding unreadable cache entry {key}: {e}")
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        response = dumps(list(return_val))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, llm_string, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, llm_string, response, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+            logger.info(f"Evicted {overflow} LLM cache entries")
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """
+        Returns the number of entries and the hit/miss counters of this process.
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {"path": self.path, "entries": entries, "max_entries": self.max_entries,
+                "hits": self.hits, "misses": self.misses}
+
+
+def enable_llm_cache(path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_CACHE_MAX_ENTRIES) -> PersistentLLMCache:
+    """
+    Installs a PersistentLLMCache as the global langchain LLM cache, so every
+    agent of every crew reads from and writes to it.
+    """
+    cache = PersistentLLMCache(path=path, max_entries=max_entries)
+    set_llm_cache(cache)
+    return cache
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Local chat model that never leaves the process.
+
+    Replies are deterministic for a given prompt and wrapped in crewAI's
+    "Final Answer:" format so the agents finish on the first iteration.
+    Pass a responder to control the text and latency to simulate API time
+    when benchmarking the batch runner.
+    """
+
+    model_name: str = "stub"
+    responder: Optional[Callable[[str], str]] = None
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "latency": self.latency}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        if self.latency:
+            time.sleep(self.latency)
+        if self.responder is not None:
+            text = self.responder(prompt)
+        else:
+            digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+            text = f"Stub response {digest} ({len(prompt)} prompt characters)."
+        if "Final Answer:" not in text:
+            text = f"Thought: I now can give a great answer\nFinal Answer: {text}"
+        message = AIMessage(content=text)
+        return ChatResult(generations=[ChatGeneration(message=message)],
+                          llm_output={"token_usage": {"prompt_tokens": len(prompt.split()),
+                                                      "completion_tokens": len(text.split()),
+                                                      "total_tokens": len(prompt.split()) + len(text.split())},
+                                      "model_name": self.model_name})